@@ -16,6 +16,13 @@
 #include "description.h"
 #include "command.h"
 
+// Traces can grow to millions of lines, so give each trace file a large
+//  buffer and write it out in big blocks
+#define TRACE_BUFFER_SIZE (1024 * 1024)
+static char potential_trace_buffer[TRACE_BUFFER_SIZE];
+static char spike_trace_buffer[TRACE_BUFFER_SIZE];
+static char message_trace_buffer[TRACE_BUFFER_SIZE];
+
 void run(struct simulation *sim, struct network *net, struct architecture *arch);
 struct timespec calculate_elapsed_time(struct timespec ts_start, struct timespec ts_end);
 
@@ -119,6 +126,8 @@ int main(int argc, char *argv[])
 			INFO("Error: Couldn't open trace file for writing.\n");
 			goto clean_up;
 		}
+		setvbuf(sim->potential_trace_fp, potential_trace_buffer,
+							_IOFBF, TRACE_BUFFER_SIZE);
 	}
 	if (sim->log_spikes)
 	{
@@ -131,6 +140,8 @@ int main(int argc, char *argv[])
 			INFO("Error: Couldn't open trace file for writing.\n");
 			goto clean_up;
 		}
+		setvbuf(sim->spike_trace_fp, spike_trace_buffer, _IOFBF,
+							TRACE_BUFFER_SIZE);
 	}
 	if (sim->log_messages)
 	{
@@ -143,6 +154,8 @@ int main(int argc, char *argv[])
 			INFO("Error: Couldn't open trace file for writing.\n");
 			goto clean_up;
 		}
+		setvbuf(sim->message_trace_fp, message_trace_buffer, _IOFBF,
+							TRACE_BUFFER_SIZE);
 
 	}
 	if (sim->log_perf)
@@ -2,14 +2,21 @@ import numpy as np
 from matplotlib import pyplot as plt
 import pandas as pd
 import networkx as nx
-from networkx.drawing.nx_agraph import graphviz_layout
 import math
 import os
 import enum
+import collections
+import functools
 import logging
 import sys
 
-np.set_printoptions(threshold=100000)
+try:
+    from numba import njit
+except ImportError:
+    # Numba is optional, without it the routing runs as plain Python
+    def njit(*args, **kwargs):
+        return lambda func: func
+
 np.seterr(invalid='raise')
 
 FORMAT = "[%(funcName)s:%(lineno)d] %(message)s"
@@ -21,8 +28,10 @@ logging.trace = partial(logging.log, logging.TRACE)
 #logging.basicConfig(format=FORMAT, level=logging.TRACE, stream=sys.stdout)
 #logging.basicConfig(format=FORMAT, level=logging.INFO, stream=sys.stdout)
 logging.basicConfig(format=FORMAT, level=logging.WARNING, stream=sys.stdout)
+logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
 def hw_str_to_core(hw_str):
     tile, core = hw_str.split('.')
     if tile != 'x' and core != 'x':
@@ -32,6 +41,57 @@ def hw_str_to_core(hw_str):
     return tile, core
 
 
+def hw_strs_to_cores(hw_strs):
+    """Parse a whole column of <tile>.<core> hw strings at once
+
+    A trace only has a few unique hw strings, so only the categories are
+    split. Returns arrays of the tile and core ids, where dummy (x.x) hw
+    strings are given as -1.
+    """
+    hw = pd.Categorical(hw_strs)
+    tiles = np.full(len(hw.categories), -1, dtype=int)
+    cores = np.full(len(hw.categories), -1, dtype=int)
+    for i, hw_str in enumerate(hw.categories):
+        tile, core = hw_str_to_core(hw_str)
+        if tile is not None:
+            tiles[i], cores[i] = tile, core
+
+    return tiles[hw.codes], cores[hw.codes]
+
+
+def read_message_trace(filename):
+    """Read a message trace into a DataFrame with a fixed column schema
+
+    The hw columns are kept as raw text: parsing "<tile>.<core>" as a float
+    first would turn e.g. "1.10" into "1.1", i.e. a different core. Uses the
+    multithreaded Arrow parser if it's installed, and pandas' C parser
+    otherwise.
+    """
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        df = pd.read_csv(filename, engine="c",
+                         dtype={"timestep": np.int32, "src_hw": str,
+                                "dest_hw": str, "hops": np.int32,
+                                "generation_delay": np.float64,
+                                "network_delay": np.float64,
+                                "processing_latency": np.float64,
+                                "blocking_latency": np.float64})
+    else:
+        column_types = {"timestep": pa.int32(), "src_hw": pa.string(),
+                        "dest_hw": pa.string(), "hops": pa.int32(),
+                        "generation_delay": pa.float64(),
+                        "network_delay": pa.float64(),
+                        "processing_latency": pa.float64(),
+                        "blocking_latency": pa.float64()}
+        convert_options = pa_csv.ConvertOptions(column_types=column_types)
+        df = pa_csv.read_csv(filename,
+                             convert_options=convert_options).to_pandas()
+
+    return df
+
+
 def graph_index(x, y, link):
     assert(x < 8)
     assert(y < 4)
@@ -49,70 +109,150 @@ def reverse_graph_index(index):
     return (x, y, link)
 
 
-def calculate_a_k(k, arrival_rate, service_distribution_pdf):
-    x = service_distribution_pdf[0]
-    y = ((arrival_rate * x) ** k) / math.factorial(k)
-    y = y * np.exp(-arrival_rate * x) * service_distribution_pdf[1]
+# The longest XY route crosses every column and row, plus the links out of the
+#  src core and into the dest core
+MAX_ROUTE_LEN = (8 - 1) + (4 - 1) + 2
 
-    #print(f"arrival:{arrival_rate} k:{k} dist:{service_distribution_pdf[1]}")
-    #print(f"x:{x} y:{y}")
 
-    a = np.sum(y)
+@njit(cache=True)
+def route_flows(flows, path_counts, path_arrival_rates, link_counts,
+                link_arrival_rates, path_links):
+    """Find the router links on the path of every flow
+
+    Messages are routed in the x direction first (east or west), and then in
+    the y direction (north or south). The graph index of every link on a path
+    is written to a row of path_links, starting from the link out of the src
+    core and ending with the link into the dest core. The link arrays are
+    flattened by graph index and updated in place. Returns the number of
+    links on each path.
+    """
+    path_lengths = np.zeros(len(flows), dtype=np.int64)
+    for idx in range(len(flows)):
+        src_core = flows[idx, 0]
+        dest_core = flows[idx, 1]
+        src_tile = src_core // 4
+        dest_tile = dest_core // 4
+        x, y = src_tile // 4, src_tile % 4
+        dest_x, dest_y = dest_tile // 4, dest_tile % 4
+
+        n = 0
+        link = 4 + (src_core % 4)
+        path_links[idx, n] = (x*4*12) + (y*12) + link
+        n += 1
+        while x != dest_x:
+            if x < dest_x:
+                x += 1
+                link = 1  # east
+            else:
+                x -= 1
+                link = 3  # west
+            path_links[idx, n] = (x*4*12) + (y*12) + link
+            n += 1
+        while y != dest_y:
+            if y < dest_y:
+                y += 1
+                link = 0  # north
+            else:
+                y -= 1
+                link = 2  # south
+            path_links[idx, n] = (x*4*12) + (y*12) + link
+            n += 1
+        link = 8 + (dest_core % 4)
+        path_links[idx, n] = (x*4*12) + (y*12) + link
+        n += 1
+        path_lengths[idx] = n
+
+        # No link is visited twice on the same path
+        for i in range(n):
+            link_counts[path_links[idx, i]] += path_counts[src_core, dest_core]
+            link_arrival_rates[path_links[idx, i]] += \
+                path_arrival_rates[src_core, dest_core]
+
+    return path_lengths
+
+
+def calculate_a(K, arrival_rate, service_distribution_pdf):
+    # Probability that exactly k messages arrive during a service time, for
+    #  all k < K. Evaluate the Poisson terms for every k and every service
+    #  time in one go, working in log space so that k! can't overflow
+    x = np.asarray(service_distribution_pdf[0])
+    lambda_x = arrival_rate * x
+    k = np.arange(K)[:, np.newaxis]
+    y = np.exp(scipy.special.xlogy(k, lambda_x) -
+               scipy.special.gammaln(k + 1) - lambda_x)
+    a = np.sum(y * service_distribution_pdf[1], axis=1)
+
+    #print(f"arrival:{arrival_rate} K:{K} dist:{service_distribution_pdf[1]}")
     #print(f"Probability of k messages (a_k):{a}")
     # a is a probability and must be < 1
-    assert(a <= 1.0)
+    assert(np.all(a <= 1.0))
 
-    # Probability that exactly k messages arrive during a service time
     return a
 
 
 def calculate_pi(K, arrival_rate, service_distribution_pdf):
+    # The same queue and distribution is often evaluated many times, so cache
+    #  the results. Arrays aren't hashable, so convert the pdf to tuples
+    values, probabilities = service_distribution_pdf
+    pi = _calculate_pi(K, arrival_rate, tuple(values), tuple(probabilities))
+    return pi.copy()
+
+
+@functools.lru_cache(maxsize=None)
+def _calculate_pi(K, arrival_rate, values, probabilities):
     pi_prime = np.zeros((K))
     pi = np.zeros((K))
 
     # Calculate the arrival (a_k) probabilities
-    a = np.zeros((K))
-    for k in range(0, K):
-        a[k] = calculate_a_k(k, arrival_rate, service_distribution_pdf)
+    a = calculate_a(K, arrival_rate, (values, probabilities))
 
     #print(f"Probability of k messages arriving: {a}")
     pi_prime[0] = 1
+    inv_a0 = 1.0 / a[0]
     for k in range(0, K-1):
-        # Compute every value of pi'
-        s = 0
-        for j in range(1, k+1):
-            s += pi_prime[j] * a[k-j+1]
-        pi_prime[k+1] = (1.0/a[0]) * (pi_prime[k] - s - a[k])
+        # Compute every value of pi', where the sum over all previous values
+        #  is a dot product with the arrival probabilities reversed
+        s = pi_prime[1:k+1] @ a[k:0:-1]
+        pi_prime[k+1] = inv_a0 * (pi_prime[k] - s - a[k])
     #print(f"pi_prime:{pi_prime}")
 
     pi[0] = 1.0 / np.sum(pi_prime)
-    for k in range(1, K):
-        pi[k] = pi[0] * pi_prime[k]
+    pi[1:] = pi[0] * pi_prime[1:]
 
     #print(f"pi[0]:{pi}")
     return pi
 
 
+def topological_sort(graph):
+    """Sort the nodes of a DAG, given as a sparse (CSR) adjacency matrix
+
+    Uses Kahn's algorithm, walking the out edges of each node directly from
+    the CSR index arrays.
+    """
+    in_degree = np.bincount(graph.indices, minlength=graph.shape[0])
+    ready = collections.deque(np.flatnonzero(in_degree == 0))
+    sorted_nodes = []
+    while ready:
+        node = ready.popleft()
+        sorted_nodes.append(node)
+        for next_node in graph.indices[graph.indptr[node]:graph.indptr[node+1]]:
+            in_degree[next_node] -= 1
+            if in_degree[next_node] == 0:
+                ready.append(next_node)
+
+    # If not every node was visited, then the graph must have a cycle
+    assert(len(sorted_nodes) == graph.shape[0])
+    return sorted_nodes
+
+
 def create_pdf(samples):
     if len(samples) == 0:
         return None
         #return np.array(0), np.array(0)
 
-    samples.sort()
-    counts = []
-    values = []
-    prev = None
-    for v in samples:
-        if v == prev:
-            counts[-1] += 1
-        else:
-            values.append(v)
-            counts.append(1)
-        prev = v
-
-    values = np.array(values)
-    counts = np.array(counts)
-    probabilities = np.array(counts) / np.sum(counts)
+    # Sort and count repeated values in one pass, using NumPy
+    values, counts = np.unique(np.asarray(samples), return_counts=True)
+    probabilities = counts / np.sum(counts)
 
     # Total probability should roughly=1
     assert abs(np.sum(probabilities) - 1.0) < 0.001
@@ -122,6 +262,8 @@ def create_pdf(samples):
 
 
 import scipy
+import scipy.sparse
+import scipy.special
 
 
 def calculate_pk_mmk1n(K, N, ro):
@@ -130,19 +272,36 @@ def calculate_pk_mmk1n(K, N, ro):
     p = np.zeros((K+1,))
 
     if (N > 0):
-        print(f"\tN packets:{N} buffer size:{K}")
+        logger.debug("\tN packets:%s buffer size:%s", N, K)
         for k in range(0, K+1):
             p[k] = scipy.special.binom(N, k) * (ro**k) * math.factorial(k)
         p = p / np.sum(p)
         assert(p[0] > 0)  # Normalize to 1
         p = np.clip(p, 0, 1)
-        print(f":\tp0:{p[0]:e}")
-        print(f"\tpk:{p}")
+        logger.debug(":\tp0:%e", p[0])
+        logger.debug("\tpk:%s", p)
 
     return p
 
 BUFFER_SIZES = (16, 10, 16, 10, 8, 8, 8, 8, 24, 24, 24, 24)
 
+
+@functools.lru_cache(maxsize=None)
+def _mm1k_blocking(K, ro):
+    # Blocking probability and mean number of messages (L) in an M/M/1/K
+    #  queue, given the server utilization (ro)
+    if (ro == 1):
+        probability_blocking = 1 / (K+1)
+        total_length = K/2
+    else:
+        ro_k = ro**K
+        ro_k_plus_1 = ro_k * ro
+        probability_blocking = ((1 - ro)*ro_k) / (1 - ro_k_plus_1)
+        total_length = (ro/(1.0-ro))
+        total_length -= (((K+1) * ro_k_plus_1) / (1 - ro_k_plus_1))  # L
+
+    return probability_blocking, total_length
+
 def calculate_queue_blocking(K, arrival_rate, mean_service_time,
                              N=None, service_pdf=None, sim_time=None,
                              remaining_flow_capacity=None):
@@ -152,8 +311,13 @@ def calculate_queue_blocking(K, arrival_rate, mean_service_time,
     #assert(mean_service_time > 0)
     #service_rate = 1 / mean_service_time
 
+    logger.debug("arrival_rate:%e mean_service_time:%s", arrival_rate,
+                 mean_service_time)
+    if arrival_rate <= 0.0 or mean_service_time <= 0.0:
+        # Either nothing arrives or messages are served instantly, so the
+        #  queue never blocks, waits or fills up
+        return 0.0, 0.0, 0.0
     ro = arrival_rate * mean_service_time
-    print(f"arrival_rate:{arrival_rate:e} mean_service_time:{mean_service_time}")
     """
     if service_pdf is not None:
         # Probability density function was given, calculate parameters for an
@@ -211,18 +375,15 @@ def calculate_queue_blocking(K, arrival_rate, mean_service_time,
         print(f"queue length:{queue_length} estimated waiting time:{mean_waiting_time}")
     """
     #else:
-    print("\tMM1K")
+    logger.debug("\tMM1K")
     # No probability density function given, assume M/M/K/1 queue
     server_utilization = ro  # Rho in queueing theory
     #print(f"server utilization: {server_utilization}")
-    if (server_utilization == 1):
-        probability_blocking = 1 / (K+1)
-        total_length = K/2
-    else:
-        probability_blocking = ((1 - ro)*(ro**K)) / (1 - (ro**(K+1)))
-        total_length = (server_utilization/(1.0-server_utilization))
-        total_length -= (((K+1) * (server_utilization**(K+1))) /
-                            (1 - server_utilization**(K+1)))  # L
+    # Many links share the same queue parameters, so the closed-form results
+    #  are cached. Round the utilization to 12 significant figures first, so
+    #  that tiny floating-point differences still hit the cache
+    probability_blocking, total_length = \
+        _mm1k_blocking(int(K), float(f"{ro:.12g}"))
 
     #p = np.zeros((K+1))
     #p[0] = (1-ro) / (1-(ro**(K+1)))
@@ -232,7 +393,7 @@ def calculate_queue_blocking(K, arrival_rate, mean_service_time,
 
     if (N is not None and mean_service_time != 0):
         mean_service_rate = (1/mean_service_time)
-        print(f"\tservice rate:{mean_service_rate:e}")
+        logger.debug("\tservice rate:%e", mean_service_rate)
         #time_until_saturation = K / (arrival_rate - mean_service_rate)
         #print(f"time until saturation:{time_until_saturation}")
         #time_until_all_sent = N / arrival_rate
@@ -257,10 +418,13 @@ def calculate_queue_blocking(K, arrival_rate, mean_service_time,
 
         # TODO: HACK - to disable
         #steady_state_ratio2 = 1.0
-        print(f"\tsim time:{sim_time} steady state ratio2:{steady_state_ratio2}")
-        print(f"\tK:{K} vs capacity:{remaining_flow_capacity}")
+        logger.debug("\tsim time:%s steady state ratio2:%s", sim_time,
+                     steady_state_ratio2)
+        logger.debug("\tK:%s vs capacity:%s", K, remaining_flow_capacity)
         #probability_blocking *= steady_state_ratio2
-        print(f"before:{probability_blocking*steady_state_ratio2} vs after:{probability_blocking*steady_state_ratio3} accounting for remaining capacity")
+        logger.debug("before:%s vs after:%s accounting for remaining capacity",
+                     probability_blocking * steady_state_ratio2,
+                     probability_blocking * steady_state_ratio3)
         #probability_blocking *= steady_state_ratio2
         probability_blocking *= steady_state_ratio3
 
@@ -279,8 +443,12 @@ def calculate_queue_blocking(K, arrival_rate, mean_service_time,
     mean_waiting_time = np.clip(mean_waiting_time, 0.0, None)
     queue_length = np.clip(queue_length, 0, None)
 
-    print(f"\tserver_utilization:{server_utilization} total length:{total_length} total wait:{total_wait}")
-    print(f"\tprob blocking {probability_blocking} queue length:{queue_length} effective_throughput:{effective_throughput:e} waiting_time:{mean_waiting_time}")
+    logger.debug("\tserver_utilization:%s total length:%s total wait:%s",
+                 server_utilization, total_length, total_wait)
+    logger.debug("\tprob blocking %s queue length:%s "
+                 "effective_throughput:%e waiting_time:%s",
+                 probability_blocking, queue_length, effective_throughput,
+                 mean_waiting_time)
     ##print(f"mean service rate:{mean_service_rate}")
 
     return probability_blocking, mean_waiting_time, queue_length
@@ -292,91 +460,100 @@ def update_buffer_queue(dependencies, link, link_arrival_rates,
                         prob_link_blocking, link_arrival_count,
                         messages_buffered, max_neuron_processing,
                         remaining_link_capacity):
-    print("** Update buffer queue **")
-    links_out = dependencies.out_edges(link)
-    print(f"links_out:{links_out}")
-    link_idx = reverse_graph_index(link)
+    logger.debug("** Update buffer queue **")
+    if link_arrival_rates[link] <= 0.0:
+        # No messages arrive at this link, so it can't block or buffer
+        prob_link_blocking[link] = 0.0
+        messages_buffered[link] = 0.0
+        return 0.0
+
+    links_out = dependencies.indices[dependencies.indptr[link]:
+                                     dependencies.indptr[link+1]]
+    logger.debug("links_out:%s", links_out)
 
     # Calculate the average server rate of all downstream links
-    for downstream in links_out:
-        downstream_link = downstream[1]
-        print(f"downstream link:{downstream_link}")
-        downstream_idx = reverse_graph_index(downstream_link)
-
-        arrival_rate_between_links = 0
-        # Find all flows through this link, going to the downstream link
-        flows_in_both_links = list(set(router_link_flows[link]) &
-                               set(router_link_flows[downstream_link]))
-        for f in flows_in_both_links:
-            path_idx = flows[f]
-            arrival_rate_between_links += path_arrival_rates[path_idx[0],
-                                                             path_idx[1]]
-            print(f"flow:{f} path idx:{path_idx} arrival:{path_arrival_rates[path_idx[0], path_idx[1]]:e}")
-
-        print(f"contention waiting time:{contention_waiting_time[downstream_idx]:e}")
-        print(f"arrival rate between links {link_idx}->{downstream_idx} = "
-              f"{arrival_rate_between_links:e}")
-        print(f"total link arrival rate: {link_arrival_rates[link_idx]:e}")
-        print(f"scaled contention time: {((contention_waiting_time[downstream_idx]*arrival_rate_between_links) / link_arrival_rates[link_idx]):e}")
-        print(f"prob blocking:{prob_link_blocking[downstream_idx]}")
-        #add = (contention_waiting_time[downstream_idx] + \
-        #    (1 / (1 - prob_link_blocking[downstream_idx]))) * \
+    for downstream_link in links_out:
+        logger.debug("downstream link:%s", downstream_link)
+
+        # Find all flows through this link, going to the downstream link.
+        #  The flows of each link are stored as sorted arrays of unique ids
+        flows_in_both_links = np.intersect1d(router_link_flows[link],
+                                             router_link_flows[downstream_link],
+                                             assume_unique=True)
+        path_idx = flows[flows_in_both_links]
+        arrival_rate_between_links = np.sum(
+            path_arrival_rates[path_idx[:, 0], path_idx[:, 1]])
+        logger.debug("flows:%s path idx:%s", flows_in_both_links, path_idx)
+
+        logger.debug("contention waiting time:%e",
+                     contention_waiting_time[downstream_link])
+        logger.debug("arrival rate between links %s->%s = %e",
+                     reverse_graph_index(link),
+                     reverse_graph_index(downstream_link),
+                     arrival_rate_between_links)
+        logger.debug("total link arrival rate: %e", link_arrival_rates[link])
+        logger.debug("scaled contention time: %e",
+                     (contention_waiting_time[downstream_link] *
+                      arrival_rate_between_links) / link_arrival_rates[link])
+        logger.debug("prob blocking:%s", prob_link_blocking[downstream_link])
+        #add = (contention_waiting_time[downstream_link] + \
+        #    (1 / (1 - prob_link_blocking[downstream_link]))) * \
         #    arrival_rate_between_links
-        #link_server_time[link_idx] += \
-        #    (contention_waiting_time[downstream_idx] + \
-        #    (1 / (1 - prob_link_blocking[downstream_idx]))) * \
+        #link_server_time[link] += \
+        #    (contention_waiting_time[downstream_link] + \
+        #    (1 / (1 - prob_link_blocking[downstream_link]))) * \
         #    arrival_rate_between_links
-        link_server_time[link_idx] += \
-            (arrival_rate_between_links) * contention_waiting_time[downstream_idx]
+        link_server_time[link] += \
+            (arrival_rate_between_links) * contention_waiting_time[downstream_link]
 
     # Normalize server time with respect with the total flow going through this
     # link
-    if (len(links_out) > 0) and (link_arrival_rates[link_idx] > 0):
-        link_server_time[link_idx] /= link_arrival_rates[link_idx]
-    print(f"link server time: {link_server_time[link_idx]}")
-    assert(link_server_time[link_idx] != math.nan)
-    assert(link_server_time[link_idx] < 1.0)
+    if (len(links_out) > 0) and (link_arrival_rates[link] > 0):
+        link_server_time[link] /= link_arrival_rates[link]
+    logger.debug("link server time: %s", link_server_time[link])
+    assert(link_server_time[link] != math.nan)
+    assert(link_server_time[link] < 1.0)
     # else this is a leaf link, and the service time is already given by the path
 
     #"""
-    buffer_size = BUFFER_SIZES[link_idx[2]]
+    buffer_size = BUFFER_SIZES[link % 12]
     #"""
 
     # Calculate the remaining flow capacity for this link, that means traversing
     #  the rest of the flow and counting the x, y links
     #calculate_remaining_flow(flow, link)
     prob_blocked, link_waiting_time, queue_length = \
-        calculate_queue_blocking(buffer_size, link_arrival_rates[link_idx],
-                                 link_server_time[link_idx],
-                                 N=link_arrival_count[link_idx],
+        calculate_queue_blocking(buffer_size, link_arrival_rates[link],
+                                 link_server_time[link],
+                                 N=link_arrival_count[link],
                                  service_pdf=None,
                                  sim_time=max_neuron_processing,
-                                 remaining_flow_capacity=remaining_link_capacity[link_idx])
+                                 remaining_flow_capacity=remaining_link_capacity[link])
     #prob_blocked, link_waiting_time, queue_length = \
-    #    calculate_queue_blocking(buffer_size, link_arrival_rates[link_idx],
-    #                             link_server_time[link_idx],
+    #    calculate_queue_blocking(buffer_size, link_arrival_rates[link],
+    #                             link_server_time[link],
     #                             N=None,
     #                             service_pdf=None,
     #                             sim_time=max_neuron_processing)
 
     """
     prob_blocked1, link_waiting_time1 = \
-        calculate_queue_blocking(10, link_arrival_rates[link_idx],
-                                 link_server_time[link_idx],
-                                 N=link_arrival_count[link_idx],
+        calculate_queue_blocking(10, link_arrival_rates[link],
+                                 link_server_time[link],
+                                 N=link_arrival_count[link],
                                  service_pdf=None)
     prob_blocked2, link_waiting_time2 = \
-        calculate_queue_blocking(100, link_arrival_rates[link_idx],
-                                 link_server_time[link_idx],
-                                 N=link_arrival_count[link_idx],
+        calculate_queue_blocking(100, link_arrival_rates[link],
+                                 link_server_time[link],
+                                 N=link_arrival_count[link],
                                  service_pdf=None)
     print(f"prob block 1:{prob_blocked1} 2:{prob_blocked2}")
     """
     #input()
 
-    print(f"link buffer waiting:{link_waiting_time:e}")
-    prob_link_blocking[link_idx] = np.clip(prob_blocked, 0, 1)
-    messages_buffered[link_idx] = np.clip(queue_length, 0, None)
+    logger.debug("link buffer waiting:%e", link_waiting_time)
+    prob_link_blocking[link] = np.clip(prob_blocked, 0, 1)
+    messages_buffered[link] = np.clip(queue_length, 0, None)
     #print(f"link server time: {link_server_time}")
     return link_waiting_time
 
@@ -386,32 +563,36 @@ def update_contention_queue(dependencies, link, link_arrival_rates,
                             prob_link_blocking,
                             link_server_time,
                             sim_time):
-    print("** Update contention queue **")
-    links_in = dependencies.in_edges(link)
-    print(f"links_in:{links_in}")
+    logger.debug("** Update contention queue **")
+    # The dependencies are stored by column (CSC), so that the upstream links
+    #  are given by the indices of each column
+    links_in = dependencies.indices[dependencies.indptr[link]:
+                                    dependencies.indptr[link+1]]
+    logger.debug("links_in:%s", links_in)
     link_in_count = len(links_in)
-    print(f"link in count:{link_in_count}")
-    link_idx = reverse_graph_index(link)
+    logger.debug("link in count:%s", link_in_count)
 
     # The server time of the queue is just the average time that the link
     #  is blocked for
     time_blocked = 0
-    if (link_in_count >= 1) and link_arrival_rates[link_idx] > 0:
+    if (link_in_count >= 1) and link_arrival_rates[link] > 0:
         # This equation doesn't work / make sense
-        #time_blocked = (1 / link_arrival_rates[link_idx]) * (1 / (1 - prob_link_blocking[link_idx]))
-        time_blocked = prob_link_blocking[link_idx] * link_server_time[link_idx]
-        print(f"time_blocked:{time_blocked} arrival:{link_arrival_rates[link_idx]:e} prob_block:{prob_link_blocking[link_idx]}")
+        #time_blocked = (1 / link_arrival_rates[link]) * (1 / (1 - prob_link_blocking[link]))
+        time_blocked = prob_link_blocking[link] * link_server_time[link]
+        logger.debug("time_blocked:%s arrival:%e prob_block:%s", time_blocked,
+                     link_arrival_rates[link], prob_link_blocking[link])
         assert(time_blocked != math.nan)
         assert(time_blocked >= 0)
         contention_server_time = time_blocked
-        print(f"prob blocked: {prob_link_blocking[link_idx]} time blocked:{contention_server_time:e}")
+        logger.debug("prob blocked: %s time blocked:%e",
+                     prob_link_blocking[link], contention_server_time)
 
-        _, contention_waiting_time[link_idx], _ = \
-            calculate_queue_blocking(link_in_count, link_arrival_rates[link_idx],
+        _, contention_waiting_time[link], _ = \
+            calculate_queue_blocking(link_in_count, link_arrival_rates[link],
                                     contention_server_time, None,
                                     sim_time=sim_time)
-    print(f"contention waiting time:{contention_waiting_time[link_idx]}")
-    print ("**end of contention**")
+    logger.debug("contention waiting time:%s", contention_waiting_time[link])
+    logger.debug("**end of contention**")
 
     return
 
@@ -424,6 +605,44 @@ router_link_names = ("north", "east", "south", "west",
                     "net_to_core_3", "net_to_core_4")
 
 
+def make_grid():
+    """Create one figure with a heat map for every type of router link
+
+    Returns the figure and the image handles of the 12 heat maps, so that
+    the same figure can be redrawn for each link metric.
+    """
+    import matplotlib.ticker as ticker
+
+    fig, ax = plt.subplots(nrows=3, ncols=4)
+    handles = []
+    for i in range(0, 12):
+        # Draw each link's 8x4 grid of routers as a single image, with x
+        #  along the horizontal axis
+        h = ax[i//4,i%4].imshow(np.zeros((4, 8)), origin="lower",
+                                cmap="YlOrRd", aspect="auto")
+        ax[i//4,i%4].set_title(router_link_names[i])
+        ax[i//4,i%4].yaxis.set_major_locator(ticker.MaxNLocator(integer=True))
+        handles.append(h)
+    # All heat maps share the same color scale, so one colorbar is enough
+    fig.colorbar(handles[0], ax=ax.ravel().tolist())
+
+    return fig, handles
+
+
+def update_grid(fig, handles, c, title=""):
+    """Redraw the link heat maps of the figure with new values"""
+    c = c.reshape(8, 4, 12)
+    cmin = 0
+    cmax = c.max()
+    for i, h in enumerate(handles):
+        h.set_array(c[:,:,i].T)
+        h.set_clim(cmin, cmax)
+    # Don't redraw here, saving the figure renders it anyway
+    fig.suptitle(title)
+
+    return
+
+
 def sim_delay_hops(flows):
     """Calculate delay of each message based on the hop count
 
@@ -895,43 +1114,38 @@ def sim_schedule_event_based_v2(df):
     return t
 
 
-def sim_delay_mm1k(df):
+def sim_delay_mm1k(df, plot=False):
     n_cores = 128
+    # All link arrays are flattened into 1-dimension by graph index
+    n_links = 8*4*12
     path_counts = np.zeros((n_cores, n_cores), dtype=int)  # [src core, dest core]
     path_arrival_latencies = np.zeros((n_cores, n_cores))
     path_server_mean_latencies = np.zeros((n_cores, n_cores))
-    router_link_flows = [[] for _ in range(0, 8*4*12)]
 
-    path_server_latencies = [[] for _ in range(0, 128)]
-    path_server_pdf = [[] for _ in range(0, 128)]
-    for s in range(0, 128):
-        path_server_latencies[s] = [[] for _ in range(0, 128)]
-        path_server_pdf[s] = [[] for _ in range(0, 128)]
+    # Latency distributions, only for (src core, dest core) pairs with
+    #  messages
+    path_server_pdf = {}
 
-    router_link_counts = np.zeros((8, 4, 12))
-    router_link_arrival_rates = np.zeros((8, 4, 12))
-
-    dependencies = nx.DiGraph()
-    # Flatten graph index into 1-dimension
-    dependencies.add_nodes_from(range(0, 8*4*12))
-    # Track the flow links
-    flow_links = [[[] for _ in range(0, 128)] for _ in range(0, 128)]
+    router_link_counts = np.zeros(n_links)
+    router_link_arrival_rates = np.zeros(n_links)
 
     # Parse the rate of messages between two cores in the network and build a
-    #  dependency graph
-    for _, row in df.iterrows():
-        src_tile, src_core = hw_str_to_core(row["src_hw"])
-        dest_tile, dest_core = hw_str_to_core(row["dest_hw"])
-        path_arrival_latencies[src_core, dest_core] += row["generation_delay"]
-        #if row["processing_latency" != 0]:
-        #    print(f"latency:{path_arrival_latencies[src_core, dest_core]}")
-        assert(row["processing_latency"] >= 0)
-        assert(row["processing_latency"] != math.nan)
-        path_server_mean_latencies[src_core, dest_core] += \
-            row["processing_latency"]
-        assert(np.all(path_server_mean_latencies >= 0))
-        path_counts[src_core, dest_core] += 1
-        path_server_latencies[src_core][dest_core].append(row["processing_latency"])
+    #  dependency graph. Dummy messages have no destination, so ignore them.
+    #  The hw strings are formatted as <tile>.<core>, where the core id is
+    #  already unique across all tiles
+    df = df[df["dest_hw"] != "x.x"]
+    _, src_cores = hw_strs_to_cores(df["src_hw"])
+    _, dest_cores = hw_strs_to_cores(df["dest_hw"])
+    generation_delays = df["generation_delay"].values.astype(float)
+    processing_latencies = df["processing_latency"].values.astype(float)
+    assert(np.all(processing_latencies >= 0))
+    assert(not np.any(np.isnan(processing_latencies)))
+
+    np.add.at(path_arrival_latencies, (src_cores, dest_cores),
+              generation_delays)
+    np.add.at(path_server_mean_latencies, (src_cores, dest_cores),
+              processing_latencies)
+    np.add.at(path_counts, (src_cores, dest_cores), 1)
 
     #assert(np.all(path_server_mean_latencies >= 0))
     #assert(not np.any(np.isnan(path_server_mean_latencies)))
@@ -940,6 +1154,7 @@ def sim_delay_mm1k(df):
 
     path_server_mean_latencies = np.divide(path_server_mean_latencies,
                                            path_counts, where=(path_counts>=1),
+                                           out=np.zeros((n_cores, n_cores)),
                                            dtype=float)
     np.clip(path_server_mean_latencies, 0.0, None)
     path_server_mean_latencies = np.nan_to_num(path_server_mean_latencies)
@@ -947,138 +1162,105 @@ def sim_delay_mm1k(df):
     #path_arrival_rates = np.divide(path_counts, np.max(path_arrival_latencies),
     #                               where=path_counts>0)  # packets/s
     path_arrival_rates = np.divide(path_counts, path_arrival_latencies*10,
-                                   where=path_counts>0)  # packets/s
+                                   where=path_counts>0,
+                                   out=np.zeros((n_cores, n_cores)))  # packets/s
 
     # Treat the neuron processing time as the simulation window
     max_neuron_processing = np.max(np.sum(path_arrival_latencies, axis=1))
 
     #print(np.ma.masked_less(path_server_rates, 1.0))
     flows = np.argwhere(path_counts >= 1)
-    # Figure out the distribution of latencies for each flow
-    for s in range(0, 128):
-        for d in range(0, 128):
-            path_server_pdf[s][d] = create_pdf(path_server_latencies[s][d])
+    # Figure out the distribution of latencies for each flow. Sort all
+    #  latencies by (src core, dest core), so that the latencies of every
+    #  flow are one contiguous slice between two group boundaries
+    keys = (src_cores * n_cores) + dest_cores
+    order = np.argsort(keys, kind="stable")
+    sorted_latencies = processing_latencies[order]
+    boundaries = np.searchsorted(keys[order], np.arange(n_cores*n_cores + 1))
+    for s, d in flows:
+        key = (s * n_cores) + d
+        path_server_pdf[(s, d)] = create_pdf(
+            sorted_latencies[boundaries[key]:boundaries[key+1]])
 
     #print(path_rates)
 
     # *** Router link model variables ***
-    prob_link_blocking = np.zeros((8, 4, 12))
-    mean_link_waiting_time = np.zeros((8, 4, 12))
-    mean_link_service_time = np.zeros((8, 4, 12))
-    messages_buffered = np.zeros((8, 4, 12))
+    prob_link_blocking = np.zeros(n_links)
+    mean_link_waiting_time = np.zeros(n_links)
+    mean_link_service_time = np.zeros(n_links)
+    messages_buffered = np.zeros(n_links)
 
     # *** Contention model variables ***
-    contention_waiting_time = np.zeros((8, 4, 12))
+    contention_waiting_time = np.zeros(n_links)
 
     # Now parse all the links between two cores. Every router has 12 links in
     #  the NoC: 4 links in the going North, East, south and West. Every router
     #  has 4 links going from the core to the router, and 4 links going out to
-    #  the cores. Compute the packet arrival rates for all links on all paths
-    for idx, flow in enumerate(flows):
-        src_core, dest_core = flow
-        assert(src_core < 128)
-        assert(dest_core < 128)
-
-        src_tile = src_core // 4
-        dest_tile = dest_core // 4
-        assert(src_tile < 32)
-        assert(dest_tile < 32)
-
-        src_x = src_tile // 4
-        src_y = src_tile % 4
-        dest_x = dest_tile // 4
-        dest_y = dest_tile % 4
-        path_rate = path_arrival_rates[src_core, dest_core]
-        path_count = path_counts[src_core, dest_core]
-
-        # Account for all the hops in between the src and dest tile
-        initial_direction = 4 + (src_core % 4)
-        router_link_counts[src_x, src_y, initial_direction] += path_count
-        router_link_arrival_rates[src_x, src_y, initial_direction] += path_rate
-        router_link_flows[graph_index(src_x, src_y, initial_direction)].append(idx)
-        prev_link = (src_x, src_y, initial_direction)
-        flow_links[src_core][dest_core].append(prev_link)
-
-        while src_x < dest_x:
-            src_x += 1
-            router_link_counts[src_x, src_y, 1] += path_count  # east
-            router_link_arrival_rates[src_x, src_y, 1] += path_rate
-            router_link_flows[graph_index(src_x, src_y, 1)].append(idx)
-            flow_links[src_core][dest_core].append(idx)
-            dependencies.add_edge(graph_index(*prev_link),
-                                graph_index(src_x, src_y, 1))
-            prev_link = (src_x, src_y, 1)
-            flow_links[src_x][src_y].append(prev_link)
-
-        while src_x > dest_x:
-            src_x -= 1
-            router_link_counts[src_x, src_y, 3] += path_count  # west
-            router_link_arrival_rates[src_x, src_y, 3] += path_rate
-            router_link_flows[graph_index(src_x, src_y, 3)].append(idx)
-            dependencies.add_edge(graph_index(*prev_link),
-                                graph_index(src_x, src_y, 3))
-            prev_link = (src_x, src_y, 3)
-            flow_links[src_core][dest_core].append(prev_link)
-
-        while src_y < dest_y:
-            src_y += 1
-            router_link_counts[src_x, src_y, 0] += path_count  # north
-            router_link_arrival_rates[src_x, src_y, 0] += path_rate
-            router_link_flows[graph_index(src_x, src_y, 0)].append(idx)
-            dependencies.add_edge(graph_index(*prev_link),
-                                graph_index(src_x, src_y, 0))
-            prev_link = (src_x, src_y, 0)
-            flow_links[src_core][dest_core].append(prev_link)
-
-        while src_y > dest_y:
-            src_y -= 1
-            router_link_counts[src_x, src_y, 2] += path_count  # south
-            router_link_arrival_rates[src_x, src_y, 2] += path_rate
-            router_link_flows[graph_index(src_x, src_y, 2)].append(idx)
-            dependencies.add_edge(graph_index(*prev_link),
-                                graph_index(src_x, src_y, 2))
-            prev_link = (src_x, src_y, 2)
-            flow_links[src_core][dest_core].append(prev_link)
-
-        final_direction = 8 + (dest_core % 4)
-        router_link_counts[src_x, src_y, final_direction] += path_count
-        router_link_arrival_rates[src_x, src_y, final_direction] += path_rate
-        router_link_flows[graph_index(src_x, src_y, final_direction)].append(idx)
-        dependencies.add_edge(graph_index(*prev_link),
-                            graph_index(src_x, src_y, final_direction))
-        flow_links[src_core][dest_core].append((src_x, src_y, final_direction))
-
-        # Track the service time at the receiving link
-        mean_link_service_time[src_x, src_y, final_direction] = \
-            path_server_mean_latencies[src_core, dest_core]
-        #print(mean_contention_delay[src_x, src_y, final_direction])
-
-
-    # Create dependency graph of all links
-    sorted_links = list(nx.topological_sort(dependencies))
+    #  the cores. Compute the packet arrival rates for all links on all paths,
+    #  where the graph index of each link is flattened into 1-dimension
+    assert(np.all(flows < 128))
+    path_links = np.full((len(flows), MAX_ROUTE_LEN), -1, dtype=np.int64)
+    path_lengths = route_flows(flows, path_counts, path_arrival_rates,
+                               router_link_counts, router_link_arrival_rates,
+                               path_links)
+    on_path = path_links >= 0
+
+    # Track the service time at the receiving link of every flow. Flows to
+    #  the same core share a receiving link, where the last flow is used
+    receive_links = path_links[np.arange(len(flows)), path_lengths-1]
+    _, last = np.unique(receive_links[::-1], return_index=True)
+    last = len(flows) - 1 - last
+    mean_link_service_time[receive_links[last]] = \
+        path_server_mean_latencies[flows[last, 0], flows[last, 1]]
+
+    # Find the flows through each link. A stable sort keeps the flows in
+    #  order, and every flow visits a link at most once, so the flows through
+    #  each link are already sorted and unique
+    link_flow_ids = np.broadcast_to(np.arange(len(flows))[:, np.newaxis],
+                                    path_links.shape)[on_path]
+    flow_graph_indices = path_links[on_path]
+    order = np.argsort(flow_graph_indices, kind="stable")
+    link_boundaries = np.searchsorted(flow_graph_indices[order],
+                                      np.arange(n_links + 1))
+    router_link_flows = np.split(link_flow_ids[order].astype(np.int32),
+                                 link_boundaries[1:-1])
+
+    # Track the edges between consecutive links on every path
+    has_next = on_path[:, 1:]
+    dependency_edges = np.stack((path_links[:, :-1][has_next],
+                                 path_links[:, 1:][has_next]), axis=1)
+
+    # Create dependency graph of all links, as a sparse adjacency matrix
+    dependencies = scipy.sparse.csr_matrix(
+        (np.ones(len(dependency_edges)),
+         (dependency_edges[:, 0], dependency_edges[:, 1])),
+        shape=(n_links, n_links))
+    dependencies.sum_duplicates()
+    dependencies_in = dependencies.tocsc()
+    # Only links on at least one flow path need to be modeled, the rest
+    #  have no arrivals and are isolated in the graph
+    sorted_links = [link for link in topological_sort(dependencies)
+                    if len(router_link_flows[link]) > 0]
     sorted_link_info = [reverse_graph_index(n) for n in sorted_links]
-    nx.nx_agraph.write_dot(dependencies, "runs/dependencies.dot")
-    D = nx.nx_agraph.to_agraph(dependencies)
-    # If we want to plot dependencies
-    #plt.figure()
-    #pos=graphviz_layout(dependencies, prog='dot')
-    #nx.draw(dependencies, pos, with_labels=False, arrows=True, node_size=0.5)
+    if plot:
+        nx.nx_agraph.write_dot(nx.DiGraph(dependency_edges.tolist()),
+                               "runs/dependencies.dot")
 
     # Go over all links in every flow, from dest to src,
     #  and track the total reamining flow capacity for that link
-    remaining_link_capacity = np.zeros((8, 4, 12))
-    for flow in flows:
+    remaining_link_capacity = np.zeros(n_links)
+    for idx, flow in enumerate(flows):
         src_core, dest_core = flow
         flow_capacity = 0
-        src_core, dest_core = flow
-        print(f"src:{src_core} dest:{dest_core}")
-        for link in flow_links[src_core][dest_core][::-1]:
-            flow_capacity += BUFFER_SIZES[link[2]]
+        logger.debug("src:%s dest:%s", src_core, dest_core)
+        for link in path_links[idx, :path_lengths[idx]][::-1]:
+            flow_capacity += BUFFER_SIZES[link % 12]
             weight = (path_arrival_rates[src_core,dest_core] / router_link_arrival_rates[link])
-            print(f"\t\tFlow:{flow} link:{link} capacity:{flow_capacity} weight:{weight}")
+            logger.debug("\t\tFlow:%s link:%s capacity:%s weight:%s", flow,
+                         link, flow_capacity, weight)
             remaining_link_capacity[link] += (flow_capacity * \
                 (path_arrival_rates[src_core,dest_core] / router_link_arrival_rates[link]))
-    print(f"Capacities at all links:{remaining_link_capacity}")
+    logger.debug("Capacities at all links:%s", remaining_link_capacity)
 
     # Now iterate over all flows again in reverse topological order, and
     #  calculate the contention delay followed by the service time at each
@@ -1088,7 +1270,7 @@ def sim_delay_mm1k(df):
     sorted_links.reverse()
     #print(sorted_links)
     for link in sorted_links:
-        print(f"UPDATING LINK: {link}")
+        logger.debug("UPDATING LINK: %s", link)
         link_wait_time = \
             update_buffer_queue(dependencies, link, router_link_arrival_rates,
                                 mean_link_service_time,
@@ -1100,114 +1282,64 @@ def sim_delay_mm1k(df):
                                 messages_buffered,
                                 max_neuron_processing,
                                 remaining_link_capacity)
-        mean_link_waiting_time[reverse_graph_index(link)] = link_wait_time
-        print(f"mean link wait times:{link_wait_time}")
-        update_contention_queue(dependencies, link, router_link_arrival_rates,
+        mean_link_waiting_time[link] = link_wait_time
+        logger.debug("mean link wait times:%s", link_wait_time)
+        update_contention_queue(dependencies_in, link, router_link_arrival_rates,
                                 contention_waiting_time, prob_link_blocking,
                                 mean_link_service_time,
                                 max_neuron_processing)
 
     # Now go through all flows, and calculate the delay for each flows path
     flow_latencies = np.zeros((128, 128))
-    for flow in flows:
+    for idx, flow in enumerate(flows):
         src_core, dest_core = flow
-        src_tile = src_core // 4
-        dest_tile = dest_core // 4
-        assert(src_tile < 32)
-        assert(dest_tile < 32)
-
-        src_x = src_tile // 4
-        src_y = src_tile % 4
-        dest_x = dest_tile // 4
-        dest_y = dest_tile % 4
-
-        # Account for all the hops in between the src and dest tile
-        initial_direction = 4 + (src_core % 4)
-        flow_latencies[src_core, dest_core] += \
-            mean_link_waiting_time[src_x, src_y, initial_direction]
-
-        while src_x < dest_x:
-            src_x += 1
-            flow_latencies[src_core, dest_core] += \
-                mean_link_waiting_time[src_x, src_y, 1]
-
-        while src_x > dest_x:
-            src_x -= 1
-            flow_latencies[src_core, dest_core] += \
-                mean_link_waiting_time[src_x, src_y, 3]
-
-        while src_y < dest_y:
-            src_y += 1
-            flow_latencies[src_core, dest_core] += \
-                mean_link_waiting_time[src_x, src_y, 0]
-
-        while src_y > dest_y:
-            src_y -= 1
-            flow_latencies[src_core, dest_core] += \
-                mean_link_waiting_time[src_x, src_y, 2]
-
-        final_direction = 8 + (dest_core % 4)
-        flow_latencies[src_core, dest_core] += \
-            mean_link_waiting_time[dest_x, dest_y, final_direction]
-
-
-    """
-    # Plot a heat map
-    plt.figure()
-    plt.title("Path Arrival Rates")
-    plt.xlabel("Source Core")
-    plt.ylabel("Destination Core")
-    x, y = np.meshgrid(np.linspace(0, 127, 128), np.linspace(0, 127, 128))
-    plt.scatter(x, y, c=path_arrival_rates, cmap="YlOrRd", s=0.4)
-    plt.colorbar()
-
-    import matplotlib.ticker as ticker
-    def create_subplots(c, title=""):
-        fig, ax = plt.subplots(nrows=3, ncols=4)
-        cmin = 0
-        cmax = np.max(c)
-        plt.suptitle(title)
-
-        for i in range(0, 12):
-            x, y = np.meshgrid(np.linspace(0, 7, 8, dtype=int),
-                            np.linspace(0, 3, 4, dtype=int))
-            pcm = ax[i//4,i%4].scatter(x, y, c=c[:,:,i], cmap="YlOrRd",
-                                       vmin=cmin, vmax=cmax)
-            ax[i//4,i%4].set_title(router_link_names[i])
-            ax[i//4,i%4].yaxis.set_major_locator(ticker.MaxNLocator(integer=True))
-
-            fig.colorbar(pcm, ax=ax[i//4,i%4])
-
-    #print(router_link_counts[:,:,4])
-    #print(router_link_arrival_latency)
-    #print(router_link_rates)
-    create_subplots(router_link_arrival_rates, "Link Arrival Rates")
-    create_subplots(prob_link_blocking, "Probability of Blocking")
-    create_subplots(mean_link_waiting_time, "Mean Link Wait Time")
-    create_subplots(messages_buffered, "Messaged Buffered")
-    create_subplots(router_link_counts, "Link Counts")
-    create_subplots(remaining_link_capacity, "Remaining Link Capacity")
-
-    # Plot a heat map
-    plt.figure()
-    plt.title("Flow Latencies")
-    plt.xlabel("Source Core")
-    plt.ylabel("Destination Core")
-    x, y = np.meshgrid(np.linspace(0, 127, 128), np.linspace(0, 127, 128))
-    plt.scatter(x, y, c=flow_latencies, cmap="YlOrRd", s=0.4)
-    plt.colorbar()
-
-    plt.figure()
-    plt.title("Path Mean Receive Latencies")
-    plt.xlabel("Source Core")
-    plt.ylabel("Destination Core")
-    x, y = np.meshgrid(np.linspace(0, 127, 128), np.linspace(0, 127, 128))
-    plt.scatter(x, y, c=path_server_mean_latencies, cmap="YlOrRd", s=0.4)
-    plt.colorbar()
-    #plt.show()
-    """
-    send_blocking_time = prob_link_blocking[:,:,4:8] * mean_link_service_time[:,:,4:8]
-    print(f"sender blocked time:{send_blocking_time}")
+        path = path_links[idx, :path_lengths[idx]]
+        flow_latencies[src_core, dest_core] = \
+            np.sum(mean_link_waiting_time[path])
+
+    if plot:
+        # Plot a heat map
+        plt.figure()
+        plt.title("Path Arrival Rates")
+        plt.xlabel("Source Core")
+        plt.ylabel("Destination Core")
+        x, y = np.meshgrid(np.linspace(0, 127, 128), np.linspace(0, 127, 128))
+        plt.scatter(x, y, c=path_arrival_rates, cmap="YlOrRd", s=0.4)
+        plt.colorbar()
+
+        # Reuse the same figure for every link metric, saving each one
+        fig, handles = make_grid()
+        link_plots = ((router_link_arrival_rates, "Link Arrival Rates"),
+                      (prob_link_blocking, "Probability of Blocking"),
+                      (mean_link_waiting_time, "Mean Link Wait Time"),
+                      (messages_buffered, "Messaged Buffered"),
+                      (router_link_counts, "Link Counts"),
+                      (remaining_link_capacity, "Remaining Link Capacity"))
+        for c, title in link_plots:
+            update_grid(fig, handles, c, title)
+            fig.savefig(os.path.join("runs", "noc",
+                                     title.lower().replace(" ", "_") + ".png"))
+
+        # Plot a heat map
+        plt.figure()
+        plt.title("Flow Latencies")
+        plt.xlabel("Source Core")
+        plt.ylabel("Destination Core")
+        x, y = np.meshgrid(np.linspace(0, 127, 128), np.linspace(0, 127, 128))
+        plt.scatter(x, y, c=flow_latencies, cmap="YlOrRd", s=0.4)
+        plt.colorbar()
+
+        plt.figure()
+        plt.title("Path Mean Receive Latencies")
+        plt.xlabel("Source Core")
+        plt.ylabel("Destination Core")
+        x, y = np.meshgrid(np.linspace(0, 127, 128), np.linspace(0, 127, 128))
+        plt.scatter(x, y, c=path_server_mean_latencies, cmap="YlOrRd", s=0.4)
+        plt.colorbar()
+        #plt.show()
+    send_blocking_time = prob_link_blocking * mean_link_service_time
+    send_blocking_time = send_blocking_time.reshape(8, 4, 12)[:,:,4:8]
+    logger.debug("sender blocked time:%s", send_blocking_time)
     #print(f"mean link transfer delay: {flow_latencies}")
     return flow_latencies, path_counts, path_server_mean_latencies, send_blocking_time
 
@@ -1294,171 +1426,181 @@ NETWORK_DIR = os.path.join(PROJECT_DIR, "runs", "dvs", "loihi_gesture_32x32")
 DVS_RUN_DIR = os.path.join(PROJECT_DIR, "runs", "dvs")
 LOIHI_TIME_DATA_PATH = os.path.join(DVS_RUN_DIR, LOIHI_TIME_DATA_FILENAME)
 
-# 1. Read in the network
-DVS_FRAME = 0
-#DVS_FRAME = 11
-filename = f"runs/noc/dvs/frame_{DVS_FRAME}.trace"
-#filename = "latin_messages.trace"
-#filename = f"runs/noc/bio/connected_layers_N841_map_luke.trace"
-#filename = "runs/noc/bio/connected_layers_N529_map_split_4.trace"
-df = pd.read_csv(filename, converters={"src_hw": str, "dest_hw": str})
-
-timesteps = 128
-#timesteps = 2
-max_latencies = np.zeros((timesteps,))
-mean_latencies = np.zeros((timesteps,))
-total_flow_latencies = np.zeros((timesteps,))
-total_core_latencies = np.zeros((timesteps,))
-max_synapse_processing = np.zeros((timesteps,))
-total_synapse_processing = np.zeros((timesteps,))
-max_neuron_processing = np.zeros((timesteps,))
-scheduled_latency = np.zeros((timesteps,))
-flow_delays1 = np.zeros((timesteps,))
-event_based_latencies = np.zeros((timesteps,))
-
-message_counts = np.zeros((timesteps,), dtype=int)
-
-
-path_counts = np.zeros((128, 128), dtype=int)  # [src core, dest core]
-
-# Queue of messages for each core
-messages = [[] for _ in range(0, 128)]
-
-for timestep in range(0, timesteps):
-#for timestep in range(50, 51):
-#for timestep in range(40, 60):
-#for timestep in range(1, 2):
-#"""
-    message_generation_latencies = np.zeros((128, 128))
-    message_receive_latencies = np.zeros((128, 128))
-    df_timestep = df[df["timestep"] == timestep]
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python message_analysis.py",
+        description="Model the NoC latencies of a SANA-FE message trace"
+    )
+    parser.add_argument("-p", "--plot", help="Plot and save the results",
+                        action="store_true")
+    args = parser.parse_args()
+
+    # 1. Read in the network
+    DVS_FRAME = 0
+    #DVS_FRAME = 11
+    filename = f"runs/noc/dvs/frame_{DVS_FRAME}.trace"
+    #filename = "latin_messages.trace"
+    #filename = f"runs/noc/bio/connected_layers_N841_map_luke.trace"
+    #filename = "runs/noc/bio/connected_layers_N529_map_split_4.trace"
+    df = read_message_trace(filename)
+
+    timesteps = 128
+    #timesteps = 2
+    max_latencies = np.zeros((timesteps,))
+    mean_latencies = np.zeros((timesteps,))
+    total_flow_latencies = np.zeros((timesteps,))
+    total_core_latencies = np.zeros((timesteps,))
+    max_synapse_processing = np.zeros((timesteps,))
+    total_synapse_processing = np.zeros((timesteps,))
+    max_neuron_processing = np.zeros((timesteps,))
+    scheduled_latency = np.zeros((timesteps,))
+    flow_delays1 = np.zeros((timesteps,))
+    event_based_latencies = np.zeros((timesteps,))
+
+    message_counts = np.zeros((timesteps,), dtype=int)
+
+
+    path_counts = np.zeros((128, 128), dtype=int)  # [src core, dest core]
+
+    # Queue of messages for each core
+    messages = [[] for _ in range(0, 128)]
 
+    for timestep in range(0, timesteps):
+    #for timestep in range(50, 51):
+    #for timestep in range(40, 60):
+    #for timestep in range(1, 2):
     #"""
-    for id, row in df_timestep.iterrows():
-        src_tile, src_core = hw_str_to_core(row["src_hw"])
-        dest_tile, dest_core = hw_str_to_core(row["dest_hw"])
-        messages[src_core].append(Message(row["src_neuron"],
-                                          row["generation_delay"],
-                                          row["processing_latency"],
-                                          row["src_hw"], row["dest_hw"],
-                                          row["hops"], id))
+        message_generation_latencies = np.zeros((128, 128))
+        message_receive_latencies = np.zeros((128, 128))
+        df_timestep = df[df["timestep"] == timestep]
+
+        #"""
+        for id, row in df_timestep.iterrows():
+            src_tile, src_core = hw_str_to_core(row["src_hw"])
+            dest_tile, dest_core = hw_str_to_core(row["dest_hw"])
+            messages[src_core].append(Message(row["src_neuron"],
+                                              row["generation_delay"],
+                                              row["processing_latency"],
+                                              row["src_hw"], row["dest_hw"],
+                                              row["hops"], id))
+
+            if dest_core is not None:
+                message_generation_latencies[src_core, dest_core] += row["generation_delay"]
+                message_receive_latencies[src_core, dest_core] += row["processing_latency"]
+                path_counts[src_core, dest_core] += 1
+                message_counts[timestep] += 1
+        #"""
+        # Display the breakdown of synapse latencies
+        #rx = np.sum(message_receive_latencies[:,:], axis=0) * 1.0e6
+        #print(f"height: {rx}")
+        #total = 0
+        #for r in rx:
+        #    plt.bar(("Timestep 50",), r, bottom=total)
+        #    total += r
+
+        print(f"** Scheduling messages for timestep:{timestep} **")
+        event_based_latencies[timestep] = sim_schedule_event_based_v2(df_timestep)
+
+        #TODO explore
+        #message_generation_latencies = df_timestep["generation_delay"].min()
+        #message_generation_latencies = df_timestep["generation_delay"].min()
+
+        flows = np.argwhere(path_counts >= 1)
+        flow_delays1[timestep] = np.max(sim_delay_hops(flows))
+        # TODO: enable again
+        """
+        flow_delays, flow_counts, _, send_block_times = sim_delay_mm1k(df_timestep, plot=args.plot)
+
+        # TODO: refactor this into its own function
+        print(f"send_block_times:{send_block_times}")
+        print(f"max(send_block_times):{np.max(send_block_times)}")
+        send_block_times = send_block_times.flatten()
+        # For all messages, update their network delay based on the average flow
+        #  delay
+        for core in range(0, 128):
+            for m in messages[core]:
+                #m.network_delay = flow_delays[core, m.dest_core]
+                m.network_delay = 0
+                #m.network_delay = 25*flow_delays[core, m.dest_core]
+                # TODO: this delay seems off by about a factor of 4?
+                # TOD+O: hack removed but see what is needed
+                #m.generation_delay += 0.2*send_block_times[core]
+                #m.generation_delay += 5.0e-9
+                #message_generation_latencies[core, m.dest_core] += 5.0e-9
+        #input()
+        scheduled_latency[timestep] = schedule_messages_detailed(messages)
+
+        #print(f"i:{timestep} max flow delay: {np.max(flow_delays):e}")
+        #max_latencies[timestep] = np.max(flow_delays)
+        """
+
+        #print(f"mean server:{message_receive_latencies}")
+        #print(f"counts:{flow_counts}")
+
+        max_neuron_processing[timestep] = np.max(np.sum(message_generation_latencies, axis=1))
+        max_synapse_processing[timestep] = np.max(np.sum(message_receive_latencies, axis=0))
+        total_synapse_processing[timestep] = np.sum(message_receive_latencies)
+        print(total_synapse_processing[timestep])
+        max_core = np.argmax(np.sum(message_receive_latencies, axis=0))
+        print(f"Max synapse processing happens on core:{max_core}")
+        print(f"Receiving latencies: {message_receive_latencies[:,max_core]}")
+        print(f"Total latencies: {np.sum(message_receive_latencies[:,max_core])}")
+        print(f"Finished scheduling messages for timestep:{timestep}")
+        #exit()
 
-        if dest_core is not None:
-            message_generation_latencies[src_core, dest_core] += row["generation_delay"]
-            message_receive_latencies[src_core, dest_core] += row["processing_latency"]
-            path_counts[src_core, dest_core] += 1
-            message_counts[timestep] += 1
+    np.savetxt("runs/noc/dvs/event_based_latencies.csv", event_based_latencies,
+               delimiter=",")
+    #np.loadtxt("runs/noc/event_based_latencies.csv", delimiter=",")
     #"""
-    # Display the breakdown of synapse latencies
-    #rx = np.sum(message_receive_latencies[:,:], axis=0) * 1.0e6
-    #print(f"height: {rx}")
-    #total = 0
-    #for r in rx:
-    #    plt.bar(("Timestep 50",), r, bottom=total)
-    #    total += r
-
-    print(f"** Scheduling messages for timestep:{timestep} **")
-    event_based_latencies[timestep] = sim_schedule_event_based_v2(df_timestep)
-
-    #TODO explore
-    #message_generation_latencies = df_timestep["generation_delay"].min()
-    #message_generation_latencies = df_timestep["generation_delay"].min()
-
-    flows = np.argwhere(path_counts >= 1)
-    flow_delays1[timestep] = np.max(sim_delay_hops(flows))
-    # TODO: enable again
-    """
-    flow_delays, flow_counts, _, send_block_times = sim_delay_mm1k(df_timestep)
-
-    # TODO: refactor this into its own function
-    print(f"send_block_times:{send_block_times}")
-    print(f"max(send_block_times):{np.max(send_block_times)}")
-    send_block_times = send_block_times.flatten()
-    # For all messages, update their network delay based on the average flow
-    #  delay
-    for core in range(0, 128):
-        for m in messages[core]:
-            #m.network_delay = flow_delays[core, m.dest_core]
-            m.network_delay = 0
-            #m.network_delay = 25*flow_delays[core, m.dest_core]
-            # TODO: this delay seems off by about a factor of 4?
-            # TOD+O: hack removed but see what is needed
-            #m.generation_delay += 0.2*send_block_times[core]
-            #m.generation_delay += 5.0e-9
-            #message_generation_latencies[core, m.dest_core] += 5.0e-9
-    #input()
-    scheduled_latency[timestep] = schedule_messages_detailed(messages)
-
-    #print(f"i:{timestep} max flow delay: {np.max(flow_delays):e}")
-    #max_latencies[timestep] = np.max(flow_delays)
-    """
 
-    #print(f"mean server:{message_receive_latencies}")
-    #print(f"counts:{flow_counts}")
-
-    max_neuron_processing[timestep] = np.max(np.sum(message_generation_latencies, axis=1))
-    max_synapse_processing[timestep] = np.max(np.sum(message_receive_latencies, axis=0))
-    total_synapse_processing[timestep] = np.sum(message_receive_latencies)
-    print(total_synapse_processing[timestep])
-    max_core = np.argmax(np.sum(message_receive_latencies, axis=0))
-    print(f"Max synapse processing happens on core:{max_core}")
-    print(f"Receiving latencies: {message_receive_latencies[:,max_core]}")
-    print(f"Total latencies: {np.sum(message_receive_latencies[:,max_core])}")
-    print(f"Finished scheduling messages for timestep:{timestep}")
     #exit()
 
-np.savetxt("runs/noc/dvs/event_based_latencies.csv", event_based_latencies,
-           delimiter=",")
-#np.loadtxt("runs/noc/event_based_latencies.csv", delimiter=",")
-#"""
-
-#exit()
-
-print(f"event latency:{event_based_latencies}")
-
-sim_time = np.zeros((timesteps,))
-for i in range(0, timesteps):
-    sim_time[i] = max(max_synapse_processing[i], max_neuron_processing[i])
-
-plt.figure(figsize=(10,2))
-loihi_data = pd.read_csv(LOIHI_TIME_DATA_PATH)
-loihi_times = np.array(loihi_data.loc[:,:] / 1.0e6)
-plt.plot(np.arange(2, timesteps), loihi_times[0:timesteps-2, DVS_FRAME] * 1.0e6, "-o")
-#plt.plot(loihi_times[0:128,DVS_FRAME] * 1.0e6, "-")
-#plt.plot(max_latencies[1:] * 1.0e6)
-plt.plot(np.arange(2, timesteps), max_synapse_processing[2:] * 1.0e6, "--")
-plt.plot(np.arange(2, timesteps), max_neuron_processing[2:] * 1.0e6, "--")
-#plt.plot(np.arange(2, timesteps), sim_time[2:] * 1.0e6)
-#plt.plot(np.arange(2, timesteps), scheduled_latency[2:] * 1.0e6)
-
-#plt.plot(np.arange(2, timesteps), message_counts[2:] * 7.7e-3)
-#plt.plot(np.arange(2, timesteps), message_counts[2:])
-#plt.plot(np.arange(2, timesteps), message_counts_tile_9[2:] * 7.7e-3)
-
-#plt.plot(np.arange(2, timesteps), total_synapse_processing[2:] * 1.0e6)
-#plt.plot(flow_delays1[1:] * 1.0e6)
-plt.plot(np.arange(2, timesteps), event_based_latencies[2:] * 1.0e6)
-
-mean_loihi = np.sum(loihi_times[0:timesteps, DVS_FRAME]) / timesteps
-mean_scheduled = np.sum(event_based_latencies[:]) / timesteps
-
-print(f"scheduled latencies:{scheduled_latency}")
-print(f"mean scheduled:{mean_scheduled:e}")
-print(f"mean loihi:{mean_loihi:e}")
-
-#plt.legend(("Measured", "Max", "Mean", "Max Synapse", "Max Neuron"), fontsize=7)
-#plt.legend(("Measured", "Synapse", "Neuron", "Event-based simulation"))
-#plt.legend(("Measured", "Synapse", "Neuron", "Max of Synapse and Neuron", "Tile 8 Messages", "Total Synapse"))
-plt.legend(("Measured", "Synapse", "Neuron", "Event Based"))
-
-plt.ylabel("Time-step Latency ($\mu$s)")
-plt.xlabel("Time-step")
-plt.yticks(np.arange(0, 61, 10))
-plt.savefig("runs/noc/dvs/series.pdf")
-
-# Calculate the error and where it comes from
-print(f"sim time:{sim_time[2:]}")
-print(f"loihi time:{loihi_times[0:timestep-1, DVS_FRAME]}")
-
-
-plt.show()
+    print(f"event latency:{event_based_latencies}")
+
+    sim_time = np.zeros((timesteps,))
+    for i in range(0, timesteps):
+        sim_time[i] = max(max_synapse_processing[i], max_neuron_processing[i])
+
+    loihi_data = pd.read_csv(LOIHI_TIME_DATA_PATH)
+    loihi_times = np.array(loihi_data.loc[:,:] / 1.0e6)
+    mean_loihi = np.sum(loihi_times[0:timesteps, DVS_FRAME]) / timesteps
+    mean_scheduled = np.sum(event_based_latencies[:]) / timesteps
+
+    print(f"scheduled latencies:{scheduled_latency}")
+    print(f"mean scheduled:{mean_scheduled:e}")
+    print(f"mean loihi:{mean_loihi:e}")
+
+    # Calculate the error and where it comes from
+    print(f"sim time:{sim_time[2:]}")
+    print(f"loihi time:{loihi_times[0:timestep-1, DVS_FRAME]}")
+
+    if args.plot:
+        plt.figure(figsize=(10,2))
+        plt.plot(np.arange(2, timesteps), loihi_times[0:timesteps-2, DVS_FRAME] * 1.0e6, "-o")
+        #plt.plot(loihi_times[0:128,DVS_FRAME] * 1.0e6, "-")
+        #plt.plot(max_latencies[1:] * 1.0e6)
+        plt.plot(np.arange(2, timesteps), max_synapse_processing[2:] * 1.0e6, "--")
+        plt.plot(np.arange(2, timesteps), max_neuron_processing[2:] * 1.0e6, "--")
+        #plt.plot(np.arange(2, timesteps), sim_time[2:] * 1.0e6)
+        #plt.plot(np.arange(2, timesteps), scheduled_latency[2:] * 1.0e6)
+
+        #plt.plot(np.arange(2, timesteps), message_counts[2:] * 7.7e-3)
+        #plt.plot(np.arange(2, timesteps), message_counts[2:])
+        #plt.plot(np.arange(2, timesteps), message_counts_tile_9[2:] * 7.7e-3)
+
+        #plt.plot(np.arange(2, timesteps), total_synapse_processing[2:] * 1.0e6)
+        #plt.plot(flow_delays1[1:] * 1.0e6)
+        plt.plot(np.arange(2, timesteps), event_based_latencies[2:] * 1.0e6)
+
+        #plt.legend(("Measured", "Max", "Mean", "Max Synapse", "Max Neuron"), fontsize=7)
+        #plt.legend(("Measured", "Synapse", "Neuron", "Event-based simulation"))
+        #plt.legend(("Measured", "Synapse", "Neuron", "Max of Synapse and Neuron", "Tile 8 Messages", "Total Synapse"))
+        plt.legend(("Measured", "Synapse", "Neuron", "Event Based"))
+
+        plt.ylabel("Time-step Latency ($\mu$s)")
+        plt.xlabel("Time-step")
+        plt.yticks(np.arange(0, 61, 10))
+        plt.savefig("runs/noc/dvs/series.pdf")
+        plt.show()
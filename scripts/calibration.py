@@ -156,12 +156,14 @@ def connected_layers(weights, spiking=True, mapping="l2_split",
         for src in layer_1.neurons:
             # Add bias to force neuron to fire
             src.add_bias(1.0)
-            for dest in layer_2.neurons:
-                # Take the ID of the neuron in the 2nd layer
-                weight = float(weights[src.id][dest.id]) / 256
-                if abs(weight) >= (1.0 / 256):
-                    # Zero weights are pruned i.e. removed
-                    src.add_connection(dest, weight)
+
+        # Zero weights are pruned i.e. removed. Threshold the whole weight
+        #  matrix at once and only visit the connections that are left
+        layer_weights = np.asarray(weights, dtype=float) / 256
+        src_ids, dest_ids = np.nonzero(np.abs(layer_weights) >= (1.0 / 256))
+        network.connect_many(layer_1, layer_2, src_ids.tolist(),
+                             dest_ids.tolist(),
+                             layer_weights[src_ids, dest_ids].tolist())
 
     return network
 
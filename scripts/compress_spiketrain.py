@@ -7,36 +7,38 @@ No. DE-NA0003525 with the U.S. Department of Energy.
 Compress spike train data for a chosen layer, same as snntoolbox format
 """
 import csv
+import numpy as np
 
 layer = '1'
-spikes = []
 
 with open("probe_spikes.csv", "r") as csvfile:
-    reader = csv.DictReader(csvfile)
-    neuron_ids = reader.fieldnames
-    layer_neurons = [n for n in neuron_ids if "{0}.".format(layer) in n]
-    print("{0} inputs / neurons found in network".format(len(layer_neurons)))
-    timestep = 1
+    neuron_ids = next(csv.reader(csvfile))
+    layer_columns = [i for i, n in enumerate(neuron_ids)
+                     if "{0}.".format(layer) in n]
+    print("{0} inputs / neurons found in network".format(len(layer_columns)))
 
-    for row in reader:
-        for n in layer_neurons:
-            spiked = int(row[n])
-            if spiked != 0:
-                neuron_id = n.split('.')[1]
-                spikes.append((timestep+1, int(neuron_id)))
+    # Load the spikes of all layer neurons as one (timestep, neuron) array
+    spiked = np.loadtxt(csvfile, delimiter=",", usecols=layer_columns,
+                        dtype=np.int32, ndmin=2)
 
-        timestep += 1
+layer_neuron_ids = np.array([int(neuron_ids[i].split('.')[1])
+                             for i in layer_columns], dtype=np.int32)
 
-# Sort the list based on the neuron id rather than timestep
-spikes.sort(key=lambda x:x[1])
+# Keep the spikes as two parallel arrays, one of spike times and one of
+#  neuron ids. The first row of spikes is recorded as timestep 2
+timestep_idx, neuron_idx = np.nonzero(spiked)
+spike_times = (timestep_idx + 2).astype(np.int32)
+spike_neurons = layer_neuron_ids[neuron_idx]
 
-spike_times = [spike[0] for spike in spikes]
-spike_neurons = [spike[1] for spike in spikes]
+# Sort the spikes based on the neuron id rather than timestep
+order = np.argsort(spike_neurons, kind="stable")
+spike_times = spike_times[order]
+spike_neurons = spike_neurons[order]
 
 # Now print in the new format
 with open("spiketrain.csv", "w") as csvfile:
     writer = csv.writer(csvfile)
-    writer.writerow(spike_neurons)
-    writer.writerow(spike_times)
+    writer.writerow(spike_neurons.tolist())
+    writer.writerow(spike_times.tolist())
 
 print("Finished converting spike train format.")
@@ -16,6 +16,9 @@ import pandas as pd
 import numpy as np
 import os
 import sys
+import functools
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.abspath((os.path.join(SCRIPT_DIR, os.pardir)))
@@ -35,16 +38,19 @@ NETWORK_DIR = os.path.join(PROJECT_DIR, "runs", "dvs", "loihi_gesture_32x32")
 DVS_RUN_DIR = os.path.join(PROJECT_DIR, "runs", "dvs")
 
 ARCH_PATH = os.path.join(PROJECT_DIR, "arch", ARCH_FILENAME)
-GENERATED_NETWORK_PATH = os.path.join(DVS_RUN_DIR, NETWORK_FILENAME)
 #LOIHI_TIME_DATA_PATH = os.path.join(DVS_RUN_DIR, "loihi_gesture_32x32_apr03", LOIHI_TIME_DATA_FILENAME)
 LOIHI_TIME_DATA_PATH = os.path.join(DVS_RUN_DIR, LOIHI_TIME_DATA_FILENAME)
 LOIHI_ENERGY_DATA_PATH = os.path.join(DVS_RUN_DIR, LOIHI_ENERGY_DATA_FILENAME)
 SIM_TIME_DATA_PATH = os.path.join(DVS_RUN_DIR, SIM_TIME_DATA_FILENAME)
 SIM_ENERGY_DATA_PATH = os.path.join(DVS_RUN_DIR, SIM_ENERGY_DATA_FILENAME)
 
+# Set SANAFE_VERBOSE in the environment to print progress for every input
+VERBOSE = bool(os.environ.get("SANAFE_VERBOSE"))
+
 
 def parse_stats(stats):
-    print("Parsing statistics")
+    if VERBOSE:
+        print("Parsing statistics")
     total = stats.sum()
     pd.set_option('display.max_rows', None)
     analysis = {}
@@ -92,6 +98,64 @@ def parse_loihi_spiketrains(total_timesteps):
     return spiketrain
 
 
+# The parts of the network shared by every input, loaded once per worker
+_network_data = None
+
+
+def init_worker():
+    global _network_data
+    # Each worker already runs its own simulator, so stop the OpenMP kernel
+    #  from also starting a thread per CPU in every worker
+    os.environ["OMP_NUM_THREADS"] = "1"
+
+    neuron_groups_filename = os.path.join(NETWORK_DIR, "neuron_groups.net")
+    with open(neuron_groups_filename, "r") as group_file:
+        group_data = group_file.read()
+
+    snn_filename = os.path.join(NETWORK_DIR, "dvs_gesture.net")
+    with open(snn_filename, "r") as snn_file:
+        snn_data = snn_file.read()
+
+    mappings_filename = os.path.join(NETWORK_DIR, "mappings.net")
+    with open(mappings_filename, "r") as mappings_file:
+        mapping_data = mappings_file.read()
+
+    _network_data = (group_data, snn_data, mapping_data)
+
+
+def run_input(inputs, timesteps):
+    # Simulate a single input frame. Every input is independent, so each
+    #  run gets its own temporary directory for the network, parsed arch and
+    #  outputs and many inputs can be simulated at once
+    if VERBOSE:
+        print(f"Running for input: {inputs}")
+
+    # First create the network file from the inputs and SNN
+    input_filename = os.path.join(NETWORK_DIR, f"inputs{inputs}.net")
+    with open(input_filename, "r") as input_file:
+        input_data = input_file.read()
+
+    group_data, snn_data, mapping_data = _network_data
+    data = (group_data + "\n" + input_data + "\n" + snn_data + "\n" +
+            mapping_data)
+    with tempfile.TemporaryDirectory(prefix=f"input{inputs}_",
+                                     dir=DVS_RUN_DIR) as run_dir:
+        network_path = os.path.join(run_dir, NETWORK_FILENAME)
+        with open(network_path, "w") as network_file:
+            network_file.write(data)
+
+        # Use a pre-generated network for a realistic use case i.e.
+        #  dvs-gesture
+        sim.run(ARCH_PATH, network_path, timesteps, run_dir=run_dir,
+                perf_trace=True, out_dir=run_dir, verbose=VERBOSE)
+        # Parse the detailed perf statistics
+        if VERBOSE:
+            print("Reading performance data")
+        stats = pd.read_csv(os.path.join(run_dir, "perf.csv"))
+
+    return parse_stats(stats)
+
+
 if __name__ == "__main__":
     run_experiments = True
     plot_experiments = True
@@ -117,21 +181,6 @@ if __name__ == "__main__":
         neurons = ""
         groups = ""
 
-        neuron_groups_filename = os.path.join(NETWORK_DIR, "neuron_groups.net")
-        with open(neuron_groups_filename, "r") as group_file:
-            group_data = group_file.read()
-
-        snn_filename = os.path.join(NETWORK_DIR, "dvs_gesture.net")
-        with open(snn_filename, "r") as snn_file:
-            snn_data = snn_file.read()
-
-        print("Reading mapping file")
-        mappings_filename = os.path.join(NETWORK_DIR, "mappings.net")
-        with open(mappings_filename, "r") as mappings_file:
-            mapping_data = mappings_file.read()
-
-        print("Reading input file")
-
         # Clear the data files
         if experiment == "energy":
             open(SIM_ENERGY_DATA_PATH, "w")
@@ -139,42 +188,28 @@ if __name__ == "__main__":
             open(SIM_TIME_DATA_PATH, "w")
         #open("hops.csv", "w")
 
-        #for inputs in range(0, frames):
-        #for inputs in range(50, frames):
-        #for inputs in range(0, 1):
-        for inputs in range(0, frames):
-            print(f"Running for input: {inputs}")
-            # First create the network file from the inputs and SNN
-            input_filename = os.path.join(NETWORK_DIR, f"inputs{inputs}.net")
-            with open(input_filename, "r") as input_file:
-                input_data = input_file.read()
-
-            data = (group_data + "\n" + input_data + "\n" + snn_data + "\n" +
-                    mapping_data)
-            with open(GENERATED_NETWORK_PATH, "w") as network_file:
-                network_file.write(data)
-
-            # Use a pre-generated network for a realistic use case i.e.
-            #  dvs-gesture
-            sim.run(ARCH_PATH, GENERATED_NETWORK_PATH, timesteps,
-                    perf_trace=True)
-            # Parse the detailed perf statistics
-            print("Reading performance data")
-            stats = pd.read_csv(os.path.join(PROJECT_DIR, "perf.csv"))
-            analysis = parse_stats(stats)
-            times = np.append(times, analysis["times"])
-            energies = np.append(energies, analysis["total_energy"] / timesteps)
-            hops = np.append(hops, analysis["hops"])
-
-            #with open("hops.csv", "a") as hops_file:
-            #    np.savetxt("hops.csv", hops, delimiter=",")
-            if experiment == "time":
-                with open(SIM_TIME_DATA_PATH, "a") as time_file:
-                    np.savetxt(SIM_TIME_DATA_PATH, times, delimiter=",")
-            else:  # energy
-                with open(SIM_ENERGY_DATA_PATH, "a") as energy_file:
-                    np.savetxt(SIM_ENERGY_DATA_PATH, energies,
-                               delimiter=",")
+        #inputs = range(0, frames)
+        #inputs = range(50, frames)
+        #inputs = range(0, 1)
+        inputs = range(0, frames)
+        run = functools.partial(run_input, timesteps=timesteps)
+        with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                 initializer=init_worker) as executor:
+            for analysis in executor.map(run, inputs):
+                times = np.append(times, analysis["times"])
+                energies = np.append(energies,
+                                     analysis["total_energy"] / timesteps)
+                hops = np.append(hops, analysis["hops"])
+
+                #with open("hops.csv", "a") as hops_file:
+                #    np.savetxt("hops.csv", hops, delimiter=",")
+                if experiment == "time":
+                    with open(SIM_TIME_DATA_PATH, "a") as time_file:
+                        np.savetxt(SIM_TIME_DATA_PATH, times, delimiter=",")
+                else:  # energy
+                    with open(SIM_ENERGY_DATA_PATH, "a") as energy_file:
+                        np.savetxt(SIM_ENERGY_DATA_PATH, energies,
+                                   delimiter=",")
 
     if plot_experiments:
         """
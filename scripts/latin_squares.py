@@ -113,6 +113,38 @@ def latin_square(N, tiles=LOIHI_TILES, cores_per_tile=LOIHI_CORES_PER_TILE,
     network.save(network_path)
 
 
+def read_spike_trace(trace_path):
+    # Every spike repeats its neuron's "<gid>.<nid>" address, so read the
+    #  neuron column dictionary-encoded and only split the unique addresses.
+    #  Use the multithreaded Arrow parser if it's installed
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        trace = pd.read_csv(trace_path, dtype={"neuron": "category",
+                                               "timestep": np.int32})
+        neurons = trace["neuron"]
+        addresses = neurons.cat.categories.to_numpy(dtype=str)
+        codes = neurons.cat.codes.to_numpy()
+    else:
+        column_types = {"neuron": pa.dictionary(pa.int32(), pa.string()),
+                        "timestep": pa.int32()}
+        convert_options = pa_csv.ConvertOptions(column_types=column_types)
+        trace = pa_csv.read_csv(trace_path, convert_options=convert_options)
+        neurons = trace["neuron"].combine_chunks()
+        addresses = np.array(neurons.dictionary.to_pylist(), dtype=str)
+        codes = neurons.indices.to_numpy()
+
+    if len(addresses) == 0:
+        # No neuron spiked, the trace is only a header
+        return np.array((), dtype=int), np.array((), dtype=int)
+
+    addresses = np.char.partition(addresses, ".")
+    gids = addresses[:, 0].astype(int)[codes]
+    nids = addresses[:, 2].astype(int)[codes]
+    return gids, nids
+
+
 def plot_results(N, network_path):
     if N < 4:
         pos = nx.nx_agraph.graphviz_layout(G)
@@ -129,23 +161,15 @@ def plot_results(N, network_path):
     print(f"Throughput: {TIMESTEPS/run_time}", flush=True)
 
     # Use spiking data to create the grid solution produced by the Loihi run
-    with open(os.path.join(PROJECT_DIR, "spikes.trace")) as spikes:
-        reader = csv.reader(spikes)
-        header = next(reader)
-
-        spike_counts = np.zeros((N, N, N))
-        for spike in reader:
-            gid_str, nid_str = spike[0].split(".")
-            gid, nid = int(gid_str), int(nid_str)
-            timestep = int(spike[1])
-
-            digit = nid
-            col = gid % N
-            row = gid // N
-            assert(digit < N)
-            assert(col < N)
-            assert(r < N)
-            spike_counts[row][col][digit] += 1
+    gids, nids = read_spike_trace(os.path.join(PROJECT_DIR, "spikes.trace"))
+
+    # Every group is one cell of the grid, in row-major order, and every
+    #  neuron is one digit. So [gid, nid] flattens to [row, col, digit] and
+    #  all spikes can be counted in a single pass
+    assert(np.all(nids < N))
+    assert(np.all(gids < (N*N)))
+    spike_counts = np.bincount((gids * N) + nids,
+                               minlength=N*N*N).reshape((N, N, N))
 
     print(spike_counts)
     chosen_digits = np.argmax(spike_counts, axis=2)
@@ -38,6 +38,8 @@ EXPERIMENT = "extremes"
 NETWORK_PATH = os.path.join("runs", "random", EXPERIMENT)
 NETWORK_FILENAME = os.path.join(NETWORK_PATH, "random.net")
 ARCH_FILENAME = "arch/loihi.yaml"
+# Set SANAFE_VERBOSE in the environment to print the results of every run
+VERBOSE = bool(os.environ.get("SANAFE_VERBOSE"))
 LOIHI_CORES = 128
 LOIHI_CORES_PER_TILE = 4
 LOIHI_TILES = int(LOIHI_CORES / LOIHI_CORES_PER_TILE)
@@ -132,19 +134,21 @@ if __name__ == "__main__":
             for line in reader:
                 start_time = time.time() 
                 results = sim.run(ARCH_FILENAME, line["network"], TIMESTEPS,
-                                  perf_trace=True)
+                                  perf_trace=True, verbose=VERBOSE)
                 run_time = time.time() - start_time
                 print(f"Run_time: {run_time}")
                 print(f"Throughput: {TIMESTEPS/run_time}", flush=True)
 
-                print(results)
+                if VERBOSE:
+                    print(results)
                 df = pd.read_csv("perf.csv")
                 line["total_spikes"] = df.loc[2, "fired"]
                 #line["loihi_energy"] = float(line["loihi_energy"])
                 #line["loihi_latency"] = float(line["loihi_latency"])
                 line["sim_energy"] = results["energy"] / TIMESTEPS
                 line["sim_latency"] = results["sim_time"] / TIMESTEPS
-                print(line)
+                if VERBOSE:
+                    print(line)
                 with open(os.path.join(NETWORK_PATH, "sim_random.csv"), "a") as out_file:
                     writer = csv.DictWriter(out_file, fieldnames=fieldnames)
                     writer.writerow(line)
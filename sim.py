@@ -22,7 +22,7 @@ class Architecture:
         for core in range(0, total_cores):
             tile, offset = (core // 4), (core % 4)
             self.core_to_address.append((tile, offset))
-            self.compartments = [self.max_compartments] * total_cores
+        self.compartments = [self.max_compartments] * total_cores
 
 
 class Network:
@@ -52,23 +52,40 @@ class Network:
         self.inputs.append(input_node)
         return input_node
 
+    def connect_many(self, src_group, dest_group, src_ids, dest_ids,
+                     weights):
+        """Add many connections between two neuron groups in one call
+
+        The i-th connection goes from neuron src_ids[i] in the src group to
+        neuron dest_ids[i] in the dest group, with weights[i]. Plain lists
+        are the fastest input, e.g. from NumPy's tolist().
+        """
+        src_neurons = src_group.neurons
+        dest_neurons = dest_group.neurons
+        for src_id, dest_id, weight in zip(src_ids, dest_ids, weights):
+            src_neurons[src_id].connections.append(
+                (dest_neurons[dest_id], weight))
+
+        return
+
     def save(self, filename, group_idx=None, save_mappings=None):
         if group_idx is None:
             group_idx = slice(0, len(self.groups))
         if save_mappings is None:
             save_mappings = self._save_mappings
 
-        with open(filename, 'w') as network_file:
-            for group in self.groups[group_idx]:
-                network_file.write(str(group))
-
-            for group in self.groups[group_idx]:
-                for neuron in group.neurons:
-                    neuron._save_mappings = save_mappings
-                    network_file.write(str(neuron))
+        groups = self.groups[group_idx]
+        for group in groups:
+            for neuron in group.neurons:
+                neuron._save_mappings = save_mappings
 
-            for input_node in self.inputs:
-                network_file.write(str(input_node))
+        # Format the whole network first and then write it out in one go
+        entries = [str(group) for group in groups]
+        entries.extend(str(neuron) for group in groups
+                       for neuron in group.neurons)
+        entries.extend(str(input_node) for input_node in self.inputs)
+        with open(filename, 'w') as network_file:
+            network_file.write("".join(entries))
 
     def load(self, filename):
         with open(filename, 'r') as network_file:
@@ -78,8 +95,7 @@ class Network:
                     # TODO: support other fields to be loaded
                     neuron_count = int(fields[1])
                     group = self.create_group(0.0, 0.0, 0)
-                    for _ in range(0, neuron_count):
-                        group.create_neuron()
+                    group.create_neurons(neuron_count)
 
                 elif fields and fields[0] == 'n':
                     pass
@@ -182,6 +198,17 @@ class NeuronGroup:
         self.neurons.append(neuron)
         return neuron
 
+    def create_neurons(self, neuron_count, log_spikes=None,
+                       log_potential=None, force_update=None):
+        """Create many neurons with the same settings in one call"""
+        first_id = len(self.neurons)
+        neurons = [Neuron(self, neuron_id, log_spikes=log_spikes,
+                          log_potential=log_potential,
+                          force_update=force_update)
+                   for neuron_id in range(first_id, first_id+neuron_count)]
+        self.neurons.extend(neurons)
+        return neurons
+
 
 class Input:
     def __init__(self, input_id):
@@ -237,20 +264,20 @@ class Neuron:
            neuron_str += f" connections_out={len(self.connections)}"
         neuron_str += "\n"
 
+        # Build the edge lines separately and join them at the end, rather
+        #  than growing the string once per connection
+        lines = [neuron_str]
         for connection in self.connections:
             dest_neuron, weight = connection
-            neuron_str += f"e {self.group.id}.{self.id}->"
-            neuron_str += f"{dest_neuron.group.id}.{dest_neuron.id}"
             if isinstance(weight, float):
-                neuron_str += f" w={weight:.5e}"
-            else:
-                neuron_str += f" w={weight}"
-            neuron_str += "\n"
+                weight = f"{weight:.5e}"
+            lines.append(f"e {self.group.id}.{self.id}->"
+                         f"{dest_neuron.group.id}.{dest_neuron.id} "
+                         f"w={weight}\n")
 
         if self._save_mappings:
-            neuron_str += "& {0}.{1}@{2}.{3}\n".format(self.group.id, self.id,
-                                                    self.tile, self.core)
-        return neuron_str
+            lines.append(f"& {self.group.id}.{self.id}@{self.tile}.{self.core}\n")
+        return "".join(lines)
 
 
 def map_neuron_to_compartment(arch, core=None):
@@ -293,14 +320,18 @@ def map_neurons_to_cores(neurons, arch, core_count):
     #print(f"Mapping dictionary: {mapping}")
 
     curr_neuron = 0
-    for core in mapping.keys():
-        # For the last core, map all remaining neurons
-        for _ in range(0, mapping[core]):
-            n = neurons[curr_neuron]
-            mapped_core = map_neuron_to_compartment(arch,
-                                                    core=core)
-            n.tile, n.core = arch.core_to_address[mapped_core]
-            curr_neuron += 1
+    for core, core_neuron_count in mapping.items():
+        if core_neuron_count == 0:
+            continue
+        # Reserve this core's compartments and look up its address once,
+        #  rather than for every neuron mapped to it
+        assert(core < len(arch.compartments) and
+               arch.compartments[core] >= core_neuron_count)
+        arch.compartments[core] -= core_neuron_count
+        address = arch.core_to_address[core]
+        for n in neurons[curr_neuron:curr_neuron+core_neuron_count]:
+            n.tile, n.core = address
+        curr_neuron += core_neuron_count
 
     assert(curr_neuron == neuron_count)
     return mapping
@@ -324,9 +355,12 @@ def create_connected_layer(network, prev_layer, input_shape, weights,
                          synapse_hw_name=synapse_hw_name)
 
     for src in prev_layer.neurons:
+        # Index one row of weights per source neuron, instead of the full
+        #  matrix for every connection
+        src_weights = weights[src.id]
         for dest in layer.neurons:
             # Take the ID of the neuron in the 2nd layer
-            weight = weights[src.id, dest.id]
+            weight = src_weights[dest.id]
             src.add_connection(dest, weight)
 
     return layer
@@ -367,6 +401,11 @@ def create_conv_layer(network, input_layer, input_shape, filters,
                                 soma_hw_name=soma_hw_name,
                                 synapse_hw_name=synapse_hw_name)
 
+    # Reorder the filters to (c_out, c_in, y, x) in one contiguous copy, so
+    #  the kernel for each pair of channels is a contiguous 2D block that
+    #  only has to be looked up once
+    kernels = filters.transpose(3, 2, 0, 1).copy()
+
     # Create the convolutional connections
     for c_out in range(0, output_channels):
         for y_out in range(0, output_height):
@@ -377,6 +416,7 @@ def create_conv_layer(network, input_layer, input_shape, filters,
 
                 dest = output_layer.neurons[dest_idx]
                 for c_in in range(0, input_channels):
+                    kernel = kernels[c_out, c_in]
                     for y_kernel in range(0, kernel_height):
                        if not 0 <= y_out*stride + y_kernel < input_height:
                             continue
@@ -390,7 +430,7 @@ def create_conv_layer(network, input_layer, input_shape, filters,
                             src_idx += ((x_out*stride) + x_kernel)
                             src = input_layer.neurons[src_idx]
 
-                            weight = filters[y_kernel, x_kernel, c_in, c_out]
+                            weight = kernel[y_kernel, x_kernel]
                             src.add_connection(dest, weight)
 
     return output_layer
@@ -411,12 +451,11 @@ def create_layer(network, layer_neuron_count,
                                        soma_hw_name=soma_hw_name,
                                        synapse_hw_name=synapse_hw_name)
 
-    for i in range(0, layer_neuron_count):
-        if (i % 1000) == 0:
-            print(f"Creating neuron {i}")
-        neuron = layer_group.create_neuron()
-        if mappings is not None:
-            neuron.tile, neuron.core = mappings[i]
+    neurons = layer_group.create_neurons(layer_neuron_count)
+    if mappings is not None:
+        assert(len(mappings) == layer_neuron_count)
+        for neuron, mapping in zip(neurons, mappings):
+            neuron.tile, neuron.core = mapping
 
     if biases is not None:
         assert(len(biases) == layer_neuron_count)
@@ -438,8 +477,7 @@ def parse_file(input_filename, output_filename):
     arch_elements = _entry_list
 
     with open(output_filename, "w") as list_file:
-        for line in arch_elements:
-            list_file.write(line + '\n')
+        list_file.write("".join(f"{line}\n" for line in arch_elements))
     return
 
 
@@ -477,18 +515,19 @@ def parse_tile(tile_dict):
         range_min, range_max = parse_range(tile_name)
     else:
         range_min, range_max = 0, 0
+    base_name = tile_name.split("[")[0]
+
+    # Add any elements local to this h/w structure. They have access to any
+    #  elements in the parent structures
+    if "core" not in tile_dict:
+        raise Exception("Error: No cores defined, "
+                        "must be at least one core")
+    cores = tile_dict["core"]
 
     for instance in range(range_min, range_max+1):
-        tile_name = tile_name.split("[")[0] + "[{0}]".format(instance)
+        tile_name = f"{base_name}[{instance}]"
         tile_id = create_tile(tile_dict, tile_name)
-
-        # Add any elements local to this h/w structure. They have access to any
-        #  elements in the parent structures
-        if "core" not in tile_dict:
-            raise Exception("Error: No cores defined, "
-                            "must be at least one core")
-        cores = tile_dict["core"]
-        for _, core_dict in enumerate(cores):
+        for core_dict in cores:
             parse_core(core_dict, tile_id)
 
     return
@@ -504,6 +543,7 @@ def parse_core(core_dict, tile_id):
         range_min, range_max = parse_range(core_name)
     else:
         range_min, range_max = 0, 0
+    base_name = core_name.split("[")[0]
 
     elements = ("axon_in", "synapse", "dendrite", "soma", "axon_out")
     for el in elements:
@@ -512,7 +552,7 @@ def parse_core(core_dict, tile_id):
                 el, core_name))
 
     for instance in range(range_min, range_max+1):
-        core_name = core_name.split("[")[0] + "[{0}]".format(instance)
+        core_name = f"{base_name}[{instance}]"
         core_id = create_core(tile_id, core_name, core_dict)
         create_axon_in(tile_id, core_id, core_dict["axon_in"][0])
 
@@ -551,13 +591,10 @@ _entry_list = []
 
 
 def format_attributes(attributes):
-    line = ""
     if attributes is None:
         attributes = {}
 
-    for key in attributes:
-        line += (f" {key}={attributes[key]}")
-    return line
+    return "".join(f" {key}={value}" for key, value in attributes.items())
 
 
 def create_tile(tile, name):
@@ -636,7 +673,7 @@ project_dir = os.path.dirname(os.path.abspath(__file__))
 def run(arch_path, network_path, timesteps,
         run_dir=os.path.join(project_dir), perf_trace=False,
         spike_trace=False, potential_trace=False, message_trace=False,
-        out_dir=None):
+        out_dir=None, verbose=True):
     parsed_filename = os.path.join(run_dir,
                                    os.path.basename(arch_path) + ".parsed")
     try:
@@ -667,7 +704,8 @@ def run(arch_path, network_path, timesteps,
     command = [os.path.join(project_dir, "sim"),] + args + [parsed_filename,
                network_path, f"{timesteps}"]
 
-    print("Command: {0}".format(" ".join(command)))
+    if verbose:
+        print("Command: {0}".format(" ".join(command)))
     ret = subprocess.call(command)
     if ret != 0:
         raise RuntimeError(f"Error: Simulator kernel failed (code={ret}).")
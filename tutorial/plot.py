@@ -32,16 +32,19 @@ results = sim.run(ARCH_PATH, NETWORK_PATH, TIMESTEPS,
 plt.rcParams.update({'font.size': 14, 'axes.linewidth': 1})
 
 ## Create the spike raster plot
-timesteps = []
-spikes = []
-with open(os.path.join(PROJECT_DIR, "tutorial", "spikes.csv")) as spikes_file:
-    spike_reader = csv.DictReader(spikes_file)
-    for line in spike_reader:
-        (nid, timestep) = line["neuron"], line["timestep"]
-        group, neuron = nid.split(".")
-        group, neuron, timestep = int(group), int(neuron), int(timestep)
-        timesteps.append(timestep)
-        spikes.append(neuron)
+# Each line of the spike trace is <group>.<neuron>,<timestep>. Read the whole
+#  file in one go and split the neuron addresses as arrays, instead of
+#  parsing row by row
+spike_data = np.loadtxt(os.path.join(PROJECT_DIR, "tutorial", "spikes.csv"),
+                        delimiter=",", skiprows=1, dtype=str).reshape(-1, 2)
+if spike_data.size > 0:
+    addresses = np.char.partition(spike_data[:, 0], ".")
+    spikes = addresses[:, 2].astype(int)
+    timesteps = spike_data[:, 1].astype(int)
+else:
+    # No neuron spiked, the trace is only a header
+    spikes = np.array((), dtype=int)
+    timesteps = np.array((), dtype=int)
 
 fig, ax = plt.subplots(2, figsize=(5, 4))
 colors = matplotlib.colors.ListedColormap(("#ff7f0e", "#1f77b4"))